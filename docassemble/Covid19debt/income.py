@@ -1,10 +1,11 @@
 from docassemble.base.core import DAObject, DAList, DADict, DAOrderedDict
-from docassemble.base.util import Value, PeriodicValue, FinancialList, PeriodicFinancialList, DAEmpty
+from docassemble.base.util import Value, PeriodicValue, FinancialList, PeriodicFinancialList, DAEmpty, currency, url_action
 from decimal import Decimal
 import datetime
 import docassemble.base.functions
 from collections import OrderedDict
 import json
+import ast
 
 
 def flatten(listname,index=1):
@@ -373,7 +374,69 @@ class Vehicle(SimpleValue):
 	def year_make_model(self):
 		return self.year + ' / ' + self.make + ' / ' + self.model
 
-class ValueList(DAList):
+# Attributes read by the amount() methods of the list items (Income, Asset, SimpleValue and PeriodicValue).
+# An item whose values for these are unchanged has an unchanged amount.
+_amount_attributes = ('exists', 'value', 'period', 'is_hourly', 'hourly_rate', 'hours_per_period', 'transaction_type')
+
+def _fingerprint(item, attributes=_amount_attributes):
+	"""Returns the values the item holds for the given attributes, read straight from the instance so that
+	undefined attributes are not looked up or asked for"""
+	values = vars(item)
+	return tuple(values.get(attribute) for attribute in attributes)
+
+class PagedList(object):
+	"""Adds a windowed table mode to a list. Only the current page of elements is shown, with the subtotal
+		of that page and the running total up to the end of it. Nothing is kept between screens except the
+		page number: the amounts are worked out from the elements each time, so the subtotal reads only the
+		page's own elements but the running total reads every element before the end of the page. Set
+		page_size with .using(page_size=...) to change the default of 10."""
+	page_size = 10
+	table_page = 0
+
+	def page_count(self):
+		"""Returns the number of pages, which is at least 1 even for an empty list"""
+		return max(1, (len(self.elements) + self.page_size - 1) // self.page_size)
+
+	def set_page(self, page):
+		"""Moves the table to the given page (counting from 0), clamped to the pages that exist"""
+		self.table_page = min(max(int(page), 0), self.page_count() - 1)
+
+	def current_page(self):
+		return min(self.table_page, self.page_count() - 1)
+
+	def page_elements(self, page=None):
+		"""Returns the elements on the given page, by default the current one"""
+		if page is None:
+			page = self.current_page()
+		start = page * self.page_size
+		return self.elements[start:start + self.page_size]
+
+	def page_total(self, page=None):
+		"""Returns the total of the elements on the given page, by default the current one"""
+		return sum((Decimal(item.amount()) for item in self.page_elements(page)), Decimal(0))
+
+	def running_total(self, page=None):
+		"""Returns the total of the elements on the given page and all of the pages before it"""
+		if page is None:
+			page = self.current_page()
+		return sum((Decimal(item.amount()) for item in self.elements[:(page + 1) * self.page_size]), Decimal(0))
+
+	def page_nav(self, action='change_table_page'):
+		"""Returns page position, subtotals and Previous/Next links for showing under a page_table.
+		Returns an empty string if the list fits on one page."""
+		if self.page_count() == 1:
+			return ''
+		page = self.current_page()
+		parts = ["Page " + str(page + 1) + " of " + str(self.page_count()),
+			"This page: " + currency(self.page_total(page)),
+			"Running total: " + currency(self.running_total(page))]
+		if page > 0:
+			parts.append("[Previous](" + url_action(action, list=self.instanceName, page=page - 1) + ")")
+		if page < self.page_count() - 1:
+			parts.append("[Next](" + url_action(action, list=self.instanceName, page=page + 1) + ")")
+		return " | ".join(parts)
+
+class ValueList(PagedList, DAList):
 	"""Represents a filterable DAList of SimpleValues"""
 	def init(self, *pargs, **kwargs):
 		super(ValueList, self).init(*pargs, **kwargs)
@@ -406,7 +469,7 @@ class ValueList(DAList):
 					result += Decimal(item.amount())
 		return result
 
-class ValueListNoObject(DAList):
+class ValueListNoObject(PagedList, DAList):
 	"""Represents a filterable DAList of SimpleValues"""
 	def init(self, *pargs, **kwargs):
 		super(ValueListNoObject, self).init(*pargs, **kwargs)
@@ -489,7 +552,7 @@ class VehicleList(ValueList):
 		super(VehicleList, self).init(*pargs, **kwargs)
 		self.object_type = Vehicle
 
-class IncomeList(DAList):
+class IncomeList(PagedList, DAList):
 	"""Represents a filterable DAList of income items, each of which has an associated period or hourly wages."""
 	
 	def init(self, *pargs, **kwargs):
@@ -641,3 +704,545 @@ class AssetList(IncomeList):
 	def init(self, *pargs, **kwargs):
 		super(AssetList, self).init(*pargs, **kwargs)
 		self.object_type = Asset
+
+class ReadOnlyObject(object):
+	"""Base for the frozen snapshot classes. Attributes are set once through _set() and cannot be changed
+		afterwards. Pickling is supported so the snapshot can live in the interview answers."""
+	__slots__ = ()
+
+	def _set(self, key, val):
+		object.__setattr__(self, key, val)
+
+	def __setattr__(self, key, val):
+		raise AttributeError(type(self).__name__ + " is read-only")
+
+	def __delattr__(self, key):
+		raise AttributeError(type(self).__name__ + " is read-only")
+
+	def _slot_names(self):
+		names = list()
+		for cls in type(self).__mro__:
+			names.extend(getattr(cls, '__slots__', ()))
+		return names
+
+	def __getstate__(self):
+		return {key: getattr(self, key) for key in self._slot_names() if hasattr(self, key)}
+
+	def __setstate__(self, state):
+		for key, val in state.items():
+			self._set(key, val)
+
+class FrozenValue(ReadOnlyObject):
+	"""Read-only copy of a single list item, made by snapshot(). The annual amount is worked out once
+		when the record is made, so amount() is a plain division and never touches the interview."""
+	__slots__ = ('type', 'value', 'period', 'owner', 'employer', 'creditor', 'name', 'notes', 'top_type',
+		'priority', 'urgency_boolean', 'annual_amount')
+
+	def __init__(self, annual_amount, **kwargs):
+		self._set('annual_amount', annual_amount)
+		for key, val in kwargs.items():
+			self._set(key, val)
+
+	def amount(self, period_to_use=1):
+		"""Returns the amount over the specified period, e.g. period_to_use=12 for a monthly figure"""
+		if period_to_use == 0:
+			return 0
+		return self.annual_amount / Decimal(period_to_use)
+
+	def __str__(self):
+		return str(self.value) if hasattr(self, 'value') else str(self.annual_amount)
+
+class FrozenList(ReadOnlyObject):
+	"""Read-only list of FrozenValues with the totals worked out in advance. Supports the parts of the
+		ValueList/IncomeList interface that the docx templates use: iteration, len, total(), types() and filter()."""
+	__slots__ = ('elements', 'grand_total', 'type_totals', 'buckets')
+
+	def __init__(self, elements, bucket_by=()):
+		elements = tuple(elements)
+		grand_total = Decimal(0)
+		type_totals = dict()
+		for item in elements:
+			grand_total += item.annual_amount
+			if hasattr(item, 'type'):
+				type_totals[item.type] = type_totals.get(item.type, Decimal(0)) + item.annual_amount
+		buckets = dict()
+		for attribute in bucket_by:
+			groups = OrderedDict()
+			for item in elements:
+				groups.setdefault(getattr(item, attribute, None), []).append(item)
+			for key, items in groups.items():
+				buckets[(attribute, key)] = FrozenList(items)
+		self._set('elements', elements)
+		self._set('grand_total', grand_total)
+		self._set('type_totals', type_totals)
+		self._set('buckets', buckets)
+
+	def __iter__(self):
+		return iter(self.elements)
+
+	def __len__(self):
+		return len(self.elements)
+
+	def __getitem__(self, index):
+		return self.elements[index]
+
+	def types(self):
+		"""Returns a set of the unique types of values stored in the list"""
+		return set(self.type_totals.keys())
+
+	def total(self, period_to_use=1, type=None):
+		"""Returns the total value in the list over the specified period.
+		You can specify type, which may be a list, to coalesce multiple entries of the same type."""
+		if period_to_use == 0:
+			return 0
+		if type is None:
+			result = self.grand_total
+		elif isinstance(type, list):
+			result = sum((self.type_totals.get(item, Decimal(0)) for item in set(type)), Decimal(0))
+		else:
+			result = self.type_totals.get(type, Decimal(0))
+		return result / Decimal(period_to_use)
+
+	def filter(self, **kwargs):
+		"""Returns a FrozenList of the items whose attributes match all of the keyword arguments.
+		Single-attribute filters on a bucketed attribute are answered from the precomputed buckets."""
+		if len(kwargs) == 1:
+			key, val = list(kwargs.items())[0]
+			if (key, val) in self.buckets:
+				return self.buckets[(key, val)]
+		return FrozenList([item for item in self.elements if all(getattr(item, key, None) == val for key, val in kwargs.items())])
+
+class FrozenDict(FrozenList):
+	"""FrozenList keyed like the DADict it was copied from, so that templates can loop over the keys
+		and look items up, as with expenses[expense]"""
+	__slots__ = ('keyed',)
+
+	def __init__(self, items, bucket_by=()):
+		self._set('keyed', OrderedDict(items))
+		super(FrozenDict, self).__init__(self.keyed.values(), bucket_by=bucket_by)
+
+	def __iter__(self):
+		return iter(self.keyed)
+
+	def __getitem__(self, key):
+		return self.keyed[key]
+
+	def keys(self):
+		return self.keyed.keys()
+
+	def values(self):
+		return self.keyed.values()
+
+	def items(self):
+		return self.keyed.items()
+
+class CaseSnapshot(ReadOnlyObject):
+	"""A read-only copy of the case, made once all of the variables for the docx templates have been
+		gathered. The templates read from the snapshot so that rendering, and the PDF conversion of each
+		attachment, never re-gathers a list or recomputes a total."""
+	__slots__ = ('jobs', 'other_income', 'income_assets', 'assets', 'expenses', 'debt', 'emergency_debts',
+		'priority_debts', 'nonpriority_debts', 'available_solutions', 'total_annual_income', 'total_assets',
+		'total_expenses')
+
+	def __init__(self, **kwargs):
+		for key, val in kwargs.items():
+			self._set(key, val)
+
+	def template_fields(self):
+		"""Returns a dict of template variables, for use as the code of a docx attachment"""
+		return {
+			'jobs': self.jobs,
+			'other_income': self.other_income,
+			'income_assets': self.income_assets,
+			'assets': self.assets,
+			'expenses': self.expenses,
+			'debt': self.debt,
+			'emergency_debts': self.emergency_debts,
+			'priority_debts': self.priority_debts,
+			'nonpriority_debts': self.nonpriority_debts,
+			'Available_solutions': self.available_solutions,
+			'total_annual_income': currency(self.total_annual_income),
+			'total_assets': currency(self.total_assets),
+			'total_expenses': currency(self.total_expenses)
+		}
+
+_frozen_attributes = ('type', 'value', 'period', 'owner', 'employer', 'creditor', 'name', 'notes', 'top_type', 'priority', 'urgency_boolean')
+
+def _freeze_value(item, required=()):
+	"""Copies one list item into a FrozenValue. Attributes in required are read directly, so that a missing
+	one is asked for the same way the template would ask for it; the rest are only copied if defined."""
+	annual_amount = Decimal(item.amount())
+	kwargs = dict()
+	for attribute in _frozen_attributes:
+		if attribute in required or hasattr(item, attribute):
+			kwargs[attribute] = getattr(item, attribute)
+	return FrozenValue(annual_amount, **kwargs)
+
+def _freeze_list(source, required=(), bucket_by=(), frozen=None):
+	"""Copies a DAList into a FrozenList. Items already copied into frozen (keyed by id) are reused,
+	so a debt that appears in several filtered lists is only copied once."""
+	if frozen is None:
+		frozen = dict()
+	if hasattr(source, '_trigger_gather'):
+		source._trigger_gather()
+	elements = list()
+	for item in source:
+		if id(item) not in frozen:
+			frozen[id(item)] = _freeze_value(item, required=required)
+		elements.append(frozen[id(item)])
+	return FrozenList(elements, bucket_by=bucket_by)
+
+def _freeze_dict(source, required=()):
+	"""Copies a DADict (e.g. a PeriodicFinancialList) into a FrozenDict, keeping its keys"""
+	if hasattr(source, '_trigger_gather'):
+		source._trigger_gather()
+	return FrozenDict([(key, _freeze_value(source[key], required=required)) for key in source.keys()])
+
+def snapshot(jobs, other_income, income_assets, assets, expenses, debt, emergency_debts, priority_debts, nonpriority_debts, available_solutions):
+	"""Freezes the case into a CaseSnapshot for the docx templates. Call once predocx_variables is reached."""
+	debt_bucket_by = ('top_type',)
+	debt_required = ('creditor', 'value', 'notes', 'top_type')
+	frozen_debts = dict()
+	case = dict()
+	case['jobs'] = _freeze_list(jobs, required=('employer',))
+	case['other_income'] = _freeze_list(other_income, required=('type',))
+	case['income_assets'] = _freeze_list(income_assets, required=('type',))
+	case['assets'] = _freeze_list(assets, required=('type', 'value'))
+	case['expenses'] = _freeze_dict(expenses, required=('type', 'value'))
+	for name, source in (('debt', debt), ('emergency_debts', emergency_debts), ('priority_debts', priority_debts), ('nonpriority_debts', nonpriority_debts)):
+		case[name] = _freeze_list(source, required=debt_required, bucket_by=debt_bucket_by, frozen=frozen_debts)
+	case['available_solutions'] = OrderedDict((key, {'title': available_solutions[key]['title'], 'details': available_solutions[key]['details']}) for key in available_solutions.keys())
+	case['total_annual_income'] = case['jobs'].total() + case['other_income'].total() + case['income_assets'].total()
+	case['total_assets'] = case['assets'].total()
+	case['total_expenses'] = case['expenses'].total()
+	return CaseSnapshot(**case)
+
+class FigureView(object):
+	"""Stands in for a list inside an eligibility formula, answering total() and len() from FinancialFigures
+		instead of rescanning the list"""
+	def __init__(self, total, count=0):
+		self._total = total
+		self._count = count
+
+	def total(self):
+		return self._total
+
+	def __len__(self):
+		return self._count
+
+class FinancialFigures(DAObject):
+	"""Keeps the derived financial figures of the case (totals, disposable income, expense advice, DRO debts
+		and the eligibility rules of the debt solutions) up to date incrementally. refresh() compares every
+		item with what it was last time, works out again only the items that changed, and then only the
+		figures that depend on them, in dependency order. A figure whose value comes out the same does not
+		cause the figures after it to be worked out again. stale_variables() names the interview variables
+		made from the figures that changed since mark_applied() was last called, so that only those need to be
+		undefined. The income from assets is worked out from the assets themselves, and fill_income_assets()
+		makes the income_assets list from it.
+
+		docassemble does not say which item an answer changed, so finding the changed items still reads every
+		item of every list passed to refresh(), and the fingerprint of every item is kept in the interview
+		answers. What is saved is working out the amounts and figures again, not reading the lists."""
+
+	sources = ('jobs', 'other_income', 'assets', 'expenses', 'debt')
+
+	# Attributes, besides those read by amount(), that an item's contribution depends on.
+	contribution_attributes = {
+		'jobs': (),
+		'other_income': (),
+		'assets': ('type', 'generates_income', 'income'),
+		'expenses': ('type',),
+		'debt': ('name',)
+	}
+
+	# Each figure and the sources or figures it is worked out from, listed so that every figure comes after its inputs.
+	figure_dependencies = OrderedDict([
+		('jobs_total', ('jobs',)),
+		('other_income_total', ('other_income',)),
+		('assets_total', ('assets',)),
+		('asset_incomes', ('assets',)),
+		('income_assets_total', ('assets',)),
+		('expenses_total', ('expenses',)),
+		('expense_advices', ('expenses',)),
+		('debt_total', ('debt',)),
+		('debt_count', ('debt',)),
+		('Dro_debt', ('debt',)),
+		('Dro_debt_not', ('debt',)),
+		('month_disposble_income', ('jobs_total', 'other_income_total', 'income_assets_total', 'expenses_total'))
+	])
+
+	# The interview variables that are made from each figure.
+	interview_variables = {
+		'expense_advices': ('expense_advices',),
+		'Dro_debt': ('Dro_debt', 'Dro_debt_not'),
+		'Dro_debt_not': ('Dro_debt', 'Dro_debt_not'),
+		'month_disposble_income': ('month_disposble_income',)
+	}
+
+	# The interview variables that are made from the eligibility rules.
+	rule_variables = ('Available_solutions', 'not_available_solution')
+
+	# The interview variables that are made from the whole case: the snapshot the documents are made from, and
+	# the documents. They are made again when any item of the lists or any eligibility rule changed.
+	case_variables = ('case_snapshot', 'instructions_sheet', 'debt_brief', 'debt_solutions_sheet')
+
+	# Names an eligibility formula may use, and the figures each one reads.
+	rule_names = {
+		'debt': ('debt_total', 'debt_count'),
+		'assets': ('assets_total',),
+		'month_disposble_income': ('month_disposble_income',),
+		'formula_value': (),
+		'len': ()
+	}
+
+	# Attributes an eligibility formula or reason may use, on debt and assets.
+	rule_attributes = ('total',)
+
+	# Names a reason may use, besides those an eligibility formula may use.
+	reason_names = ('currency', 'str')
+
+	def init(self, *pargs, **kwargs):
+		super(FinancialFigures, self).init(*pargs, **kwargs)
+		self.item_cache = dict()
+		self.source_totals = dict()
+		self.figure_values = dict()
+		self.rules = OrderedDict()
+		self.rule_values = dict()
+		self.last_changed = list()
+		self.last_changed_rules = list()
+		self.last_changed_sources = list()
+		self.average_cost_living = dict()
+		self.dro_notcover_list = list()
+
+	def figure(self, name):
+		"""Returns the current value of a figure. Lists are returned as copies."""
+		result = self.figure_values[name]
+		if isinstance(result, list):
+			return list(result)
+		return result
+
+	def has_rule(self, solution, requirement):
+		return (solution, requirement) in self.rules
+
+	def rule(self, solution, requirement):
+		"""Returns the current result of an eligibility rule added with add_rules(), working it out from the
+		current figures the first time it is asked for"""
+		key = (solution, requirement)
+		if key not in self.rule_values:
+			formula, formula_value, dependencies, reason = self.rules[key]
+			self.rule_values[key] = self._evaluate_rule(formula, formula_value)
+		return self.rule_values[key]
+
+	def reason(self, solution, requirement):
+		"""Returns the sample_reason of an eligibility rule added with add_rules(), worked out from the current
+		figures, or None if it has no sample_reason"""
+		formula, formula_value, dependencies, reason = self.rules[(solution, requirement)]
+		if reason is None:
+			return None
+		return self._evaluate_rule(reason, formula_value)
+
+	def add_rules(self, solution, requirements):
+		"""Adds the requirements of a debt solution that have a sample_formula and formula_value as eligibility
+		rules. Requirements whose formula uses anything other than the debt, asset and disposable income figures
+		are not added and are left to the interview. A sample_reason that uses anything else is not kept."""
+		for requirement in requirements.keys():
+			spec = requirements[requirement]
+			if (solution, requirement) in self.rules or 'sample_formula' not in spec or 'formula_value' not in spec:
+				continue
+			formula = str(spec['sample_formula']).strip()
+			names = self._names_used(formula, self.rule_names)
+			if names is None:
+				continue
+			reason = None
+			if 'sample_reason' in spec and self._names_used(str(spec['sample_reason']).strip(), tuple(self.rule_names) + self.reason_names) is not None:
+				reason = str(spec['sample_reason']).strip()
+			dependencies = set()
+			for name in names:
+				dependencies.update(self.rule_names[name])
+			self.rules[(solution, requirement)] = (formula, spec['formula_value'], tuple(sorted(dependencies)), reason)
+
+	def stale_variables(self):
+		"""Returns the interview variables made from the figures, rules and lists that changed since mark_applied()"""
+		result = list()
+		for name in self.last_changed:
+			for variable in self.interview_variables.get(name, ()):
+				if variable not in result:
+					result.append(variable)
+		if self.last_changed_rules:
+			result.extend(self.rule_variables)
+		if self.last_changed_sources or self.last_changed_rules:
+			result.extend(self.case_variables)
+		return result
+
+	def refresh(self, average_cost_living=None, dro_notcover_list=None, **kwargs):
+		"""Brings the figures up to date with the lists passed as keyword arguments (any of the names in sources).
+		Lists that are not passed are taken to be unchanged. Returns the names of the figures that changed. These,
+		the (solution, requirement) keys of the rules that changed and the names of the lists with an item that
+		changed are added to last_changed, last_changed_rules and last_changed_sources until mark_applied() is
+		called. An item counts as changed if anything the case snapshot copies from it changed. Expense advice is only given for the types whose entry in average_cost_living is a
+		number; the interview's own average_cost_living holds help text, so it gives none."""
+		dirty = set()
+		if average_cost_living is not None:
+			averages = dict((key, average_cost_living[key]) for key in average_cost_living.keys() if isinstance(average_cost_living[key], (int, float, Decimal)))
+			if averages != self.average_cost_living:
+				self.average_cost_living = averages
+				self.item_cache.pop('expenses', None)
+		if dro_notcover_list is not None and list(dro_notcover_list) != self.dro_notcover_list:
+			self.dro_notcover_list = list(dro_notcover_list)
+			dirty.add('debt')
+		for source in self.sources:
+			if source in kwargs:
+				changed_indexes, previous = self._refresh_items(source, kwargs[source])
+				if changed_indexes is not None:
+					dirty.add(source)
+					self._apply_deltas(source, changed_indexes, previous)
+					if source not in self.last_changed_sources:
+						self.last_changed_sources.append(source)
+		changed = list()
+		for name, dependencies in self.figure_dependencies.items():
+			if not all(self._is_known(dependency) for dependency in dependencies):
+				continue
+			if name in self.figure_values and not dirty.intersection(dependencies):
+				continue
+			result = self._compute_figure(name)
+			if name not in self.figure_values or result != self.figure_values[name]:
+				self.figure_values[name] = result
+				dirty.add(name)
+				changed.append(name)
+		changed_rules = list()
+		for key, (formula, formula_value, dependencies, reason) in self.rules.items():
+			if key not in self.rule_values or not dirty.intersection(dependencies):
+				continue
+			result = self._evaluate_rule(formula, formula_value)
+			if result != self.rule_values[key]:
+				self.rule_values[key] = result
+				changed_rules.append(key)
+		self.last_changed.extend(name for name in changed if name not in self.last_changed)
+		self.last_changed_rules.extend(key for key in changed_rules if key not in self.last_changed_rules)
+		return changed
+
+	def mark_applied(self):
+		"""Forgets the changes kept in last_changed, last_changed_rules and last_changed_sources, once the interview
+		has acted on them"""
+		self.last_changed = list()
+		self.last_changed_rules = list()
+		self.last_changed_sources = list()
+
+	def fill_income_assets(self, income_assets):
+		"""Makes income_assets hold one entry for each asset that generates income, in the order of the assets given
+		to the last refresh(). The list is only cleared and filled again if those entries changed."""
+		entries = self.figure('asset_incomes')
+		if [_fingerprint(item, ('type', 'value', 'period')) for item in income_assets.elements] == entries:
+			return
+		income_assets.clear()
+		for asset_type, income, period in entries:
+			income_assets.appendObject(type=asset_type, value=income, period=period)
+
+	def _is_known(self, name):
+		return name in self.item_cache or name in self.figure_values
+
+	def _refresh_items(self, source, items):
+		"""Works out the contribution of each item of source that is new or has changed since the last refresh.
+		Returns the indexes that changed (None if nothing did) and the previous entries. If the list got longer
+		or shorter, every index counts as changed. Nothing is stored until every contribution has been worked out."""
+		if hasattr(items, 'keys'):
+			items = [items[key] for key in items.keys()]
+		else:
+			items = list(items)
+		attributes = tuple(OrderedDict.fromkeys(_amount_attributes + self.contribution_attributes[source] + _frozen_attributes))
+		old = self.item_cache.get(source)
+		entries = list()
+		changed_indexes = list()
+		for index, item in enumerate(items):
+			fingerprint = _fingerprint(item, attributes)
+			if old is not None and len(old) == len(items) and old[index][0] == fingerprint:
+				entries.append(old[index])
+			else:
+				entries.append((fingerprint, self._contribution(source, item)))
+				changed_indexes.append(index)
+		if old is not None and len(old) == len(items) and not changed_indexes:
+			return None, old
+		self.item_cache[source] = entries
+		return changed_indexes, old
+
+	def _contribution(self, source, item):
+		"""Returns what one item adds to the figures: its annual amount and, for expenses, debts and assets that
+		generate income, the advice about it, its name or the type, income and period of the asset"""
+		if source == 'expenses':
+			advice = None
+			if item.type in self.average_cost_living:
+				spend_diff = Decimal(item.value) - Decimal(self.average_cost_living[item.type])
+				if spend_diff < 0 and abs(spend_diff) > 40:
+					advice = "You spend " + currency(item.value) + " on " + item.type + "  which is " + currency(abs(spend_diff)) + " less than average expenditure " + currency(self.average_cost_living[item.type]) + " per month."
+				elif spend_diff > 0 and abs(spend_diff) > 40:
+					advice = "You spend " + currency(item.value) + " on " + item.type + "  which is " + currency(abs(spend_diff)) + " more than average expenditure " + currency(self.average_cost_living[item.type]) + " per month."
+			return (Decimal(item.amount()), advice)
+		if source == 'debt':
+			return (Decimal(item.amount()), item.name)
+		if source == 'assets' and item.generates_income:
+			return (Decimal(item.amount()), (item.type, item.income, item.period))
+		return (Decimal(item.amount()), None)
+
+	def _item_totals(self, source, contribution):
+		"""Returns the totals that one item's contribution adds to, and what it adds to each. An asset that
+		generates income adds to the income from assets as well as to the assets."""
+		if source == 'assets':
+			income = Decimal(0) if contribution[1] is None else Decimal(contribution[1][1]) * Decimal(contribution[1][2])
+			return (('assets', contribution[0]), ('income_assets', income))
+		return ((source, contribution[0]),)
+
+	def _apply_deltas(self, source, changed_indexes, previous):
+		"""Adjusts the totals of source by the change in each changed item, rather than adding them up again"""
+		entries = self.item_cache[source]
+		if previous is None or len(previous) != len(entries):
+			for name, amount in self._item_totals(source, (Decimal(0), None)):
+				self.source_totals[name] = Decimal(0)
+			for entry in entries:
+				for name, amount in self._item_totals(source, entry[1]):
+					self.source_totals[name] += amount
+			return
+		for index in changed_indexes:
+			for (name, amount), (old_name, old_amount) in zip(self._item_totals(source, entries[index][1]), self._item_totals(source, previous[index][1])):
+				self.source_totals[name] += amount - old_amount
+
+	def _compute_figure(self, name):
+		if name in ('jobs_total', 'other_income_total', 'income_assets_total', 'assets_total', 'expenses_total', 'debt_total'):
+			return self.source_totals[name[:-len('_total')]]
+		if name == 'asset_incomes':
+			return [entry[1][1] for entry in self.item_cache['assets'] if entry[1][1] is not None]
+		if name == 'expense_advices':
+			return [entry[1][1] for entry in self.item_cache['expenses'] if entry[1][1] is not None]
+		if name == 'debt_count':
+			return len(self.item_cache['debt'])
+		if name == 'Dro_debt':
+			return [entry[1][1] for entry in self.item_cache['debt'] if entry[1][1] not in self.dro_notcover_list]
+		if name == 'Dro_debt_not':
+			return [entry[1][1] for entry in self.item_cache['debt'] if entry[1][1] in self.dro_notcover_list] or ["None"]
+		if name == 'month_disposble_income':
+			return (self.figure_values['jobs_total'] / 12 + self.figure_values['other_income_total'] / 12 + self.figure_values['income_assets_total'] / 12) - self.figure_values['expenses_total'] / 12
+		raise Exception("FinancialFigures: unknown figure " + name)
+
+	def _names_used(self, expression, allowed):
+		"""Returns the names that expression uses, or None if it uses a name that is not in allowed or an attribute
+		that is not in rule_attributes"""
+		names = set()
+		for node in ast.walk(ast.parse(expression, mode='eval')):
+			if isinstance(node, ast.Name):
+				if node.id not in allowed:
+					return None
+				names.add(node.id)
+			elif isinstance(node, ast.Attribute) and node.attr not in self.rule_attributes:
+				return None
+		return names
+
+	def _evaluate_rule(self, formula, formula_value):
+		names = {
+			'debt': FigureView(self.figure_values['debt_total'], self.figure_values['debt_count']),
+			'assets': FigureView(self.figure_values['assets_total']),
+			'month_disposble_income': self.figure_values['month_disposble_income'],
+			'formula_value': formula_value,
+			'len': len,
+			'currency': currency,
+			'str': str
+		}
+		return eval(formula, {'__builtins__': {}}, names)
@@ -54,6 +54,7 @@ setup(name='docassemble.Covid19debt',
       packages=find_packages(),
       namespace_packages=['docassemble'],
       install_requires=[],
+      extras_require={'test': ['docassemble.base', 'pytest', 'PyYAML']},
       zip_safe=False,
       package_data=find_package_data(where='docassemble/Covid19debt/', package='docassemble.Covid19debt'),
      )
@@ -0,0 +1,33 @@
+import os
+import re
+
+import yaml
+
+INTERVIEW = os.path.join(os.path.dirname(__file__), '..', 'docassemble', 'Covid19debt', 'data', 'questions', 'DebtReport.yml')
+
+
+def make_list(cls, name, items, **kwargs):
+	"""Returns a gathered list of class cls with the given items, as the interview would have it after gathering"""
+	result = cls(name, auto_gather=False, gathered=True, **kwargs)
+	for item in items:
+		result.append(item)
+	return result
+
+
+def interview_block(block_id):
+	"""Returns the block of DebtReport.yml with the given id. The blocks are parsed one at a time, because
+	some other blocks of the file do not parse."""
+	with open(INTERVIEW, encoding='utf-8') as interview:
+		blocks = re.split(r'^---[ \t]*$', interview.read(), flags=re.MULTILINE)
+	for block in blocks:
+		if re.search(r'^id: *' + re.escape(block_id) + r' *$', block, flags=re.MULTILINE):
+			return yaml.safe_load(block)
+	raise KeyError(block_id)
+
+
+def interview_code(block_id):
+	"""Runs the code of the block of DebtReport.yml with the given id and returns the variables it defines"""
+	names = dict()
+	exec(interview_block(block_id)['code'], names)
+	del names['__builtins__']
+	return names
@@ -0,0 +1,285 @@
+from decimal import Decimal
+
+import pytest
+
+from docassemble.base.util import PeriodicValue, PeriodicFinancialList, currency
+from conftest import make_list, interview_block, interview_code
+from docassemble.Covid19debt.income import (Job, JobList, Income, IncomeList, SimpleValue, ValueList,
+	ValueListNoObject, Debt, FinancialFigures)
+
+AVERAGE_COST_LIVING = interview_code('average cost of living')['average_cost_living']
+DRO_NOTCOVER_LIST = interview_code('debt types not covered by a debt relief order')['Dro_notcover_list']
+CASE_VARIABLES = ['case_snapshot', 'instructions_sheet', 'debt_brief', 'debt_solutions_sheet']
+
+# (sample_formula, formula_value, the formula it replaces), as in the Debt Solutions block of DebtReport.yml
+REQUIREMENTS = {
+	'Minimum Amount': ('(debt.total() < formula_value)', 750, '(debt.total() < 750)'),
+	'Maximum Assets': ('formula_value <= assets.total()', 2000, '2000 <= assets.total()'),
+	'Maximum Income': ('month_disposble_income >= formula_value', 75, 'month_disposble_income >= 75'),
+	'Maximum Amount': ('formula_value < debt.total()', 5000, '5000 < debt.total()'),
+	'Minimum Number of Debts': ('len(debt) <=formula_value', 1, 'len(debt) <=1')
+}
+
+
+@pytest.fixture
+def case():
+	expenses = PeriodicFinancialList('expenses', auto_gather=False, gathered=True)
+	expenses['rent'] = PeriodicValue(type='HOUSING', value=900, period=12, exists=True)
+	expenses['food'] = PeriodicValue(type='OTHER HOUSEHOLD ITEMS, TOILETRIES AND FOOD', value=290, period=12, exists=True)
+	return dict(
+		jobs=make_list(JobList, 'jobs', [
+			Job(employer='Acme', value=1000, period=12),
+			Job(employer='Corner shop', is_hourly=True, hourly_rate=10, hours_per_period=20, period=52)]),
+		other_income=make_list(IncomeList, 'other_income', [Income(type='pension', value=50, period=52)]),
+		assets=make_list(ValueList, 'assets', [
+			SimpleValue(type='vehicle', value=1500, generates_income=False),
+			SimpleValue(type='flat', value=250, generates_income=True, income=100, period=12),
+			SimpleValue(type='savings', value=0, generates_income=True, income=5, period=1)]),
+		expenses=expenses,
+		debt=make_list(ValueListNoObject, 'debt', [
+			Debt(name='TV license', value=150),
+			Debt(name='Credit card', value=2500),
+			Debt(name='Student Loans', value=9000)]))
+
+
+def refresh(figures, case):
+	return figures.refresh(average_cost_living=AVERAGE_COST_LIVING, dro_notcover_list=DRO_NOTCOVER_LIST, **case)
+
+
+def make_figures(case):
+	figures = FinancialFigures('figures')
+	refresh(figures, case)
+	requirements = {name: {'sample_formula': spec[0], 'formula_value': spec[1]} for name, spec in REQUIREMENTS.items()}
+	requirements['Nonhomeowner'] = {'formula': False}
+	figures.add_rules('Solution', requirements)
+	for name in REQUIREMENTS:
+		figures.rule('Solution', name)
+	figures.mark_applied()
+	return figures
+
+
+def interview_requirements(solution):
+	"""Returns the requirements of a solution in the Debt Solutions block, as data from code makes them. The
+	formulas of the requirements that are not rules use interview answers, so they are left out."""
+	requirements = interview_block('Debt Solutions')['data from code'][solution]['requirements']
+	return {name: {key: eval(str(value)) for key, value in spec.items() if key != 'formula'} for name, spec in requirements.items()}
+
+
+def baseline_income_assets(assets):
+	# The income from assets calculation block, with its counter fixed
+	income_assets = make_list(IncomeList, 'income_assets', [])
+	for asset in assets:
+		if asset.generates_income:
+			income_assets.append(Income(type=asset.type, value=asset.income, period=asset.period))
+	return income_assets
+
+
+def baseline_month_disposble_income(case):
+	return case['jobs'].total(period_to_use=12) + case['other_income'].total(period_to_use=12) + baseline_income_assets(case['assets']).total(period_to_use=12) - case['expenses'].total(period_to_use=12)
+
+
+def baseline_rules(case):
+	names = {'debt': case['debt'], 'assets': case['assets'], 'month_disposble_income': baseline_month_disposble_income(case)}
+	return {name: eval(spec[2], {}, names) for name, spec in REQUIREMENTS.items()}
+
+
+def baseline_dro(case):
+	# The baseline block, which assumed at most one excluded debt
+	Dro_debt_not = ["None"]
+	Dro_debt = []
+	for item in case['debt']:
+		if item.name in DRO_NOTCOVER_LIST:
+			if "None" in Dro_debt_not:
+				Dro_debt_not.remove("None")
+			Dro_debt_not.append(item.name)
+		else:
+			Dro_debt.append(item.name)
+	return Dro_debt, Dro_debt_not
+
+
+def assert_matches_baseline(figures, case):
+	assert round(figures.figure('month_disposble_income'), 10) == round(baseline_month_disposble_income(case), 10)
+	assert figures.figure('debt_total') == case['debt'].total()
+	assert figures.figure('assets_total') == case['assets'].total()
+	assert figures.figure('income_assets_total') == baseline_income_assets(case['assets']).total()
+	assert figures.figure('expenses_total') == case['expenses'].total()
+	assert (figures.figure('Dro_debt'), figures.figure('Dro_debt_not')) == baseline_dro(case)
+	for name, result in baseline_rules(case).items():
+		assert figures.rule('Solution', name) == result, name
+
+
+def test_figures_match_baseline_formulas(case):
+	figures = make_figures(case)
+	assert_matches_baseline(figures, case)
+	assert not figures.has_rule('Solution', 'Nonhomeowner')
+	assert figures.figure('expense_advices') == []
+
+
+def test_unchanged_refresh_reports_nothing(case):
+	figures = make_figures(case)
+	assert refresh(figures, case) == []
+	assert figures.last_changed_rules == []
+	assert figures.stale_variables() == []
+
+
+def test_debt_edit_only_recomputes_what_depends_on_debt(case):
+	figures = make_figures(case)
+	case['debt'][2].value = 100
+	assert refresh(figures, case) == ['debt_total']
+	assert figures.last_changed_rules == [('Solution', 'Maximum Amount')]
+	assert figures.stale_variables() == ['Available_solutions', 'not_available_solution'] + CASE_VARIABLES
+	assert_matches_baseline(figures, case)
+
+
+def test_job_edit_cascades_to_disposable_income_and_rules(case):
+	figures = make_figures(case)
+	case['jobs'][0].value = 0
+	assert refresh(figures, case) == ['jobs_total', 'month_disposble_income']
+	assert figures.last_changed_rules == [('Solution', 'Maximum Income')]
+	assert figures.stale_variables() == ['month_disposble_income', 'Available_solutions', 'not_available_solution'] + CASE_VARIABLES
+	assert_matches_baseline(figures, case)
+
+
+def test_debt_rename_changes_dro_lists(case):
+	figures = make_figures(case)
+	case['debt'][1].name = 'Student Loans'
+	assert refresh(figures, case) == ['Dro_debt', 'Dro_debt_not']
+	assert figures.stale_variables() == ['Dro_debt', 'Dro_debt_not'] + CASE_VARIABLES
+	assert_matches_baseline(figures, case)
+
+
+def test_added_debt(case):
+	figures = make_figures(case)
+	case['debt'].append(Debt(name='Payday loan', value=10))
+	assert 'debt_count' in refresh(figures, case)
+	assert_matches_baseline(figures, case)
+
+
+def test_transaction_type_is_part_of_the_fingerprint(case):
+	figures = make_figures(case)
+	case['assets'][0].transaction_type = 'expense'
+	assert refresh(figures, case) == ['assets_total']
+	assert figures.figure('assets_total') == case['assets'].total()
+	assert_matches_baseline(figures, case)
+
+
+def test_exists_is_part_of_the_fingerprint(case):
+	figures = make_figures(case)
+	case['expenses']['rent'].exists = False
+	assert 'expenses_total' in refresh(figures, case)
+	assert figures.figure('expenses_total') == case['expenses'].total()
+	assert_matches_baseline(figures, case)
+
+
+def test_hourly_rate_is_part_of_the_fingerprint(case):
+	figures = make_figures(case)
+	case['jobs'][1].hourly_rate = 12
+	assert 'jobs_total' in refresh(figures, case)
+	assert figures.figure('jobs_total') == case['jobs'].total()
+	assert_matches_baseline(figures, case)
+
+
+def test_expense_advice_compares_with_numeric_averages(case):
+	figures = make_figures(case)
+	assert figures.refresh(average_cost_living={'HOUSING': 700, 'FUEL': 'Fuel costs include...'}, expenses=case['expenses']) == ['expense_advices']
+	assert figures.figure('expense_advices') == [
+		"You spend £900.00 on HOUSING  which is £200.00 more than average expenditure £700.00 per month."]
+	case['expenses']['food'].type = 'HOUSING'
+	assert figures.refresh(expenses=case['expenses']) == ['expense_advices']
+	assert len(figures.figure('expense_advices')) == 2
+
+
+def test_lists_not_passed_are_left_alone(case):
+	figures = make_figures(case)
+	case['jobs'][0].value = 100
+	assert figures.refresh(debt=case['debt']) == []
+	assert figures.refresh(jobs=case['jobs']) == ['jobs_total', 'month_disposble_income']
+	assert isinstance(figures.figure('jobs_total'), Decimal)
+
+
+def test_income_assets_are_filled_from_the_assets(case):
+	figures = make_figures(case)
+	income_assets = make_list(IncomeList, 'income_assets', [])
+	figures.fill_income_assets(income_assets)
+	assert [(item.type, item.value, item.period) for item in income_assets] == [('flat', 100, 12), ('savings', 5, 1)]
+	assert income_assets.total() == baseline_income_assets(case['assets']).total()
+
+
+def test_asset_that_stops_generating_income_leaves_income_assets(case):
+	figures = make_figures(case)
+	income_assets = make_list(IncomeList, 'income_assets', [])
+	figures.fill_income_assets(income_assets)
+	case['assets'][1].generates_income = False
+	assert figures.refresh(assets=case['assets']) == ['asset_incomes', 'income_assets_total', 'month_disposble_income']
+	figures.fill_income_assets(income_assets)
+	assert [item.type for item in income_assets] == ['savings']
+	assert figures.figure('income_assets_total') == income_assets.total() == 5
+	assert_matches_baseline(figures, case)
+
+
+def test_income_assets_are_kept_when_asset_income_is_unchanged(case):
+	figures = make_figures(case)
+	income_assets = make_list(IncomeList, 'income_assets', [])
+	figures.fill_income_assets(income_assets)
+	kept = list(income_assets.elements)
+	case['assets'][1].value = 300
+	assert figures.refresh(assets=case['assets']) == ['assets_total']
+	figures.fill_income_assets(income_assets)
+	assert income_assets.elements == kept
+	assert all(item is previous for item, previous in zip(income_assets.elements, kept))
+
+
+def test_changes_are_kept_until_applied(case):
+	figures = make_figures(case)
+	case['assets'][2].income = 50
+	assert figures.refresh(assets=case['assets']) == ['asset_incomes', 'income_assets_total', 'month_disposble_income']
+	assert refresh(figures, case) == []
+	assert figures.stale_variables() == ['month_disposble_income'] + CASE_VARIABLES
+	figures.mark_applied()
+	assert figures.stale_variables() == []
+	assert_matches_baseline(figures, case)
+
+
+def test_interview_requirements_are_rules_with_reasons(case):
+	figures = make_figures(case)
+	for solution in ('Bankruptcy', 'Debt Relief Order', 'Administration Order', 'Individual Voluntary Agreement'):
+		requirements = interview_requirements(solution)
+		figures.add_rules(solution, requirements)
+		for name, spec in requirements.items():
+			assert figures.has_rule(solution, name) == ('sample_formula' in spec), name
+			if figures.has_rule(solution, name):
+				assert isinstance(figures.reason(solution, name), str), name
+
+
+def test_reasons_are_worked_out_from_the_current_figures(case):
+	figures = make_figures(case)
+	figures.add_rules('Debt Relief Order', interview_requirements('Debt Relief Order'))
+	assert figures.reason('Debt Relief Order', 'Maximum Amount') == "Your debt amount " + currency(case['debt'].total()) + " exceeded maximum allowance " + currency(30000)
+	case['debt'][2].value = 100
+	refresh(figures, case)
+	assert figures.reason('Debt Relief Order', 'Maximum Amount') == "Your debt amount " + currency(case['debt'].total()) + " exceeded maximum allowance " + currency(30000)
+	figures.add_rules('Administration Order', interview_requirements('Administration Order'))
+	assert figures.reason('Administration Order', 'Minimum Number of Debts') == "you need to have more than 1 debts, you currently have: 3 debts"
+
+
+def test_total_is_only_allowed_as_an_attribute(case):
+	figures = make_figures(case)
+	figures.add_rules('Other', {
+		'Bare total': {'sample_formula': 'total(debt) > formula_value', 'formula_value': 1},
+		'Other attribute': {'sample_formula': 'debt.elements > formula_value', 'formula_value': 1},
+		'Unknown reason': {'sample_formula': 'debt.total() > formula_value', 'formula_value': 1, 'sample_reason': 'str(user)'}})
+	assert not figures.has_rule('Other', 'Bare total')
+	assert not figures.has_rule('Other', 'Other attribute')
+	assert figures.rule('Other', 'Unknown reason')
+	assert figures.reason('Other', 'Unknown reason') is None
+
+
+def test_change_copied_into_the_snapshot_remakes_the_documents(case):
+	figures = make_figures(case)
+	case['debt'][1].creditor = 'Bank'
+	assert refresh(figures, case) == []
+	assert figures.last_changed_sources == ['debt']
+	assert figures.stale_variables() == CASE_VARIABLES
+	figures.mark_applied()
+	assert refresh(figures, case) == []
+	assert figures.stale_variables() == []
@@ -0,0 +1,93 @@
+from decimal import Decimal
+
+from conftest import make_list
+from docassemble.Covid19debt.income import Income, IncomeList, SimpleValue, ValueList
+
+
+def make_assets(count, value=1):
+	return make_list(ValueList, 'assets', [SimpleValue(type='savings', value=value) for index in range(count)])
+
+
+def test_pages_and_subtotals():
+	assets = make_assets(25)
+	assert assets.page_count() == 3
+	assert len(assets.page_elements(2)) == 5
+	assert assets.page_total(0) == 10
+	assert assets.page_total(2) == 5
+	assert assets.running_total(1) == 20
+	assert assets.running_total(2) == assets.total() == 25
+
+
+def test_set_page_is_clamped():
+	assets = make_assets(25)
+	assets.set_page(9)
+	assert assets.current_page() == 2
+	assets.set_page(-1)
+	assert assets.current_page() == 0
+
+
+def test_edit_on_earlier_page_reaches_later_running_totals():
+	assets = make_assets(25)
+	assert assets.running_total(2) == 25
+	assets.set_page(2)
+	assets.elements[0].value = 100
+	assert assets.running_total(2) == 124
+	assert assets.running_total() == 124
+	assert assets.page_total(0) == 109
+	assert assets.page_total(1) == 10
+
+
+def test_rebuild_with_same_length_is_picked_up():
+	income_assets = make_list(IncomeList, 'income_assets', [Income(type='rent', value=1, period=12) for index in range(25)])
+	assert income_assets.running_total(2) == 300
+	income_assets.elements = list()
+	for index in range(25):
+		income_assets.append(Income(type='rent', value=2, period=12))
+	assert income_assets.running_total(2) == 600
+
+
+def test_added_and_removed_elements():
+	assets = make_assets(20)
+	assert assets.total() == 20
+	assets.append(SimpleValue(type='savings', value=5))
+	assert assets.page_count() == 3
+	assert assets.running_total(2) == 25
+	del assets.elements[0]
+	assert assets.page_count() == 2
+	assert assets.page_total(1) == 14
+	assert assets.total() == 24
+
+
+def test_change_to_other_amount_input_is_picked_up():
+	assets = make_assets(12)
+	assert assets.total() == 12
+	assets.elements[11].transaction_type = 'expense'
+	assert assets.page_total(1) == 0
+	assert assets.running_total(1) == assets.total() == 10
+
+
+def test_page_size_change_rebuilds_pages():
+	assets = make_assets(25)
+	assert assets.page_total(0) == 10
+	assets.page_size = 5
+	assert assets.page_count() == 5
+	assert assets.page_total(0) == 5
+	assert assets.running_total(3) == 20
+
+
+def test_page_nav():
+	assert make_assets(3).page_nav() == ''
+	assets = make_assets(25)
+	assets.set_page(1)
+	nav = assets.page_nav()
+	assert 'Page 2 of 3' in nav
+	assert 'Previous' in nav and 'Next' in nav
+	assert isinstance(assets.running_total(), Decimal)
+
+
+def test_only_the_page_number_is_stored():
+	assets = make_assets(25)
+	before = set(vars(assets))
+	assets.set_page(2)
+	assets.page_nav()
+	assert set(vars(assets)) - before == {'table_page'}
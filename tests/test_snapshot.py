@@ -0,0 +1,104 @@
+import pickle
+from decimal import Decimal
+
+import pytest
+
+from docassemble.base.util import PeriodicValue, PeriodicFinancialList
+from conftest import make_list
+from docassemble.Covid19debt.income import (Job, JobList, Income, IncomeList, SimpleValue, ValueList,
+	ValueListNoObject, Debt, FrozenList, snapshot)
+
+
+@pytest.fixture
+def case():
+	jobs = make_list(JobList, 'jobs', [
+		Job(employer='Acme', value=1000, period=12),
+		Job(employer='Corner shop', is_hourly=True, hourly_rate=10, hours_per_period=20, period=52)])
+	other_income = make_list(IncomeList, 'other_income', [Income(type='pension', value=50, period=52)])
+	income_assets = make_list(IncomeList, 'income_assets', [Income(type='rent', value=200, period=12)])
+	assets = make_list(ValueList, 'assets', [
+		SimpleValue(type='vehicle', value=1500),
+		SimpleValue(type='savings', value=250)])
+	expenses = PeriodicFinancialList('expenses', auto_gather=False, gathered=True)
+	expenses['rent'] = PeriodicValue(type='Rent', value=600, period=12, exists=True)
+	expenses['food'] = PeriodicValue(type='Food & Non-Alcoholic Drinks', value=50, period=52, exists=True)
+	debt = make_list(ValueListNoObject, 'debt', [
+		Debt(creditor='Council', name='Council Tax', value=800, notes='', top_type='Tax', urgency_boolean=True),
+		Debt(creditor='Bank', name='Credit card', value=2500, notes='', top_type='Loans', urgency_boolean=False, priority=False),
+		Debt(creditor='Lender', name='Payday loan', value=300, notes='', top_type='Loans', urgency_boolean=False, priority=True)])
+	emergency_debts = debt.filter(urgency_boolean=True)
+	nonemergency_debts = debt.filter(urgency_boolean=False)
+	solutions = {'Debt Relief Order': {'title': 'Debt Relief Order', 'details': 'dro.docx'}}
+	frozen = snapshot(jobs, other_income, income_assets, assets, expenses, debt, emergency_debts,
+		nonemergency_debts.filter(priority=True), nonemergency_debts.filter(priority=False), solutions)
+	return dict(jobs=jobs, other_income=other_income, income_assets=income_assets, assets=assets,
+		expenses=expenses, debt=debt, snapshot=frozen)
+
+
+def test_totals_match_live_lists(case):
+	frozen = case['snapshot']
+	assert frozen.jobs.total() == case['jobs'].total()
+	assert frozen.jobs.total(period_to_use=12) == case['jobs'].total(period_to_use=12)
+	assert frozen.other_income.total() == case['other_income'].total()
+	assert frozen.income_assets.total() == case['income_assets'].total()
+	assert frozen.assets.total() == case['assets'].total()
+	assert frozen.assets.total(type='vehicle') == case['assets'].total(type='vehicle')
+	assert frozen.expenses.total() == case['expenses'].total()
+	assert frozen.debt.total() == case['debt'].total()
+	assert frozen.total_annual_income == case['jobs'].total() + case['other_income'].total() + case['income_assets'].total()
+
+
+def test_item_amounts_match_live_items(case):
+	frozen = case['snapshot']
+	for live, copy in zip(case['jobs'], frozen.jobs):
+		assert copy.amount() == live.amount()
+		assert copy.amount(period_to_use=12) == live.amount(period_to_use=12)
+	assert frozen.jobs[0].employer == 'Acme'
+
+
+def test_filter_buckets_match_live_filter(case):
+	frozen = case['snapshot']
+	for top_type in ('Tax', 'Loans', 'Fines'):
+		live = case['debt'].filter(top_type=top_type)
+		assert [item.creditor for item in frozen.debt.filter(top_type=top_type)] == [item.creditor for item in live]
+	assert frozen.debt.filter(top_type='Loans') is frozen.debt.filter(top_type='Loans')
+	assert [item.creditor for item in frozen.debt.filter(top_type='Loans', priority=True)] == ['Lender']
+	assert [item.creditor for item in frozen.priority_debts.filter(top_type='Loans')] == ['Lender']
+
+
+def test_debt_records_are_shared_between_lists(case):
+	frozen = case['snapshot']
+	assert frozen.emergency_debts[0] is frozen.debt[0]
+	assert frozen.nonpriority_debts[0] is frozen.debt[1]
+
+
+def test_expenses_keep_their_keys(case):
+	frozen = case['snapshot']
+	assert list(frozen.expenses) == list(case['expenses'].keys())
+	assert frozen.expenses['rent'].value == 600
+
+
+def test_template_fields(case):
+	fields = case['snapshot'].template_fields()
+	assert fields['Available_solutions']['Debt Relief Order']['title'] == 'Debt Relief Order'
+	assert fields['priority_debts'] is case['snapshot'].priority_debts
+	assert isinstance(fields['total_assets'], str)
+
+
+def test_snapshot_is_read_only(case):
+	frozen = case['snapshot']
+	with pytest.raises(AttributeError):
+		frozen.debt = None
+	with pytest.raises(AttributeError):
+		frozen.debt[0].value = 0
+	with pytest.raises(AttributeError):
+		frozen.debt.grand_total = Decimal(0)
+
+
+def test_snapshot_survives_pickling(case):
+	frozen = pickle.loads(pickle.dumps(case['snapshot']))
+	assert frozen.debt.total() == case['debt'].total()
+	assert list(frozen.expenses) == ['rent', 'food']
+	assert isinstance(frozen.debt.filter(top_type='Tax'), FrozenList)
+	with pytest.raises(AttributeError):
+		frozen.debt[0].value = 0